@@ -1,8 +1,22 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import functools
+import hashlib
+import httpx
+import itertools
+import logging
+import orjson
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
+import random
+import tempfile
+import time
 from dotenv import load_dotenv
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Union
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables from .env file
 load_dotenv()
@@ -15,6 +29,18 @@ CLIENT_SECRET: Optional[str] = os.getenv("client_secret")
 TOKEN_URL: str = "https://www.warcraftlogs.com/oauth/token"
 API_URL: str = "https://www.warcraftlogs.com/api/v2/client"
 
+# Access tokens are cached on disk so consecutive runs can skip the OAuth round-trip.
+TOKEN_CACHE_FILE: str = os.path.expanduser("~/.cache/wcl_token.json")
+TOKEN_EXPIRY_MARGIN: float = 30.0  # Refresh a little before the token actually expires
+
+# Rankings responses are cached on disk, keyed by the query variables.
+RANKINGS_CACHE_DIR: str = os.path.expanduser("~/.cache/wcl")
+RANKINGS_CACHE_TTL: float = 3600.0  # Seconds; rankings only move over hours
+
+# Only the first page of rankings is requested, and only its top entries are kept.
+RANKINGS_PAGE: int = 1
+RANKINGS_LIMIT: int = 10
+
 # Encounter Details for the latest final boss (Gallywix - Mythic)
 # You can find these IDs by browsing the Warcraft Logs website.
 # The URL for the rankings page will contain the encounter ID.
@@ -22,10 +48,155 @@ ENCOUNTER_ID: int = 3016  # Gallywix
 DIFFICULTY: int = 5       # 5 corresponds to Mythic difficulty
 METRIC: str = "dps"       # We want to get DPS rankings
 
+# Markdown table layout, built once instead of on every formatting call
+MARKDOWN_HEADERS: List[str] = ["Rank", "Player", "DPS", "Class", "Spec", "Guild", "Server", "Report"]
+MARKDOWN_TABLE_HEADER: str = " | ".join(MARKDOWN_HEADERS) + "\n" + " | ".join(["---"] * len(MARKDOWN_HEADERS))
+MARKDOWN_ROW_FORMAT: str = "{rank} | {name} | {amount:.2f} | {cls} | {spec} | {guild} | {server} | {report}"
+
+# GraphQL query to fetch the rankings
+RANKINGS_QUERY: str = """
+    query($encounterID: Int!, $difficulty: Int!, $metric: CharacterRankingMetricType!, $page: Int!) {
+      worldData {
+        encounter(id: $encounterID) {
+          name
+          characterRankings(metric: $metric, difficulty: $difficulty, page: $page)
+        }
+      }
+    }
+    """
+
+# Headers shared by every GraphQL request; only Authorization varies per token.
+_BASE_HEADERS: Dict[str, str] = {"Content-Type": "application/json"}
+
+# Automatic persisted queries: once the server has seen RANKINGS_QUERY, later
+# calls send only its SHA-256 hash instead of re-uploading the whole document.
+RANKINGS_QUERY_HASH: str = hashlib.sha256(RANKINGS_QUERY.encode()).hexdigest()
+PERSISTED_QUERY_EXTENSIONS: Dict[str, Any] = {"persistedQuery": {"version": 1, "sha256Hash": RANKINGS_QUERY_HASH}}
+
+# Retry policy for rate limiting (429) and transient server errors.
+RETRY_STATUS_CODES: tuple[int, ...] = (429, 500, 502, 503, 504)
+MAX_RETRIES: int = 5
+RETRY_BACKOFF_BASE: float = 0.5  # Seconds, doubled on every attempt
+RETRY_BACKOFF_CAP: float = 30.0
+
+class _CappedRetry(Retry):
+    """urllib3 Retry policy whose Retry-After waits never exceed RETRY_BACKOFF_CAP."""
+
+    def parse_retry_after(self, retry_after: str) -> float:
+        return min(RETRY_BACKOFF_CAP, super().parse_retry_after(retry_after))
+
+# Shared HTTP session so keep-alive reuses the TCP/TLS connection across calls.
+HTTP_POOL_MAXSIZE: int = 16  # Connections kept alive per host; also caps get_many_dps_rankings workers
+_RETRY: Retry = _CappedRetry(
+    total=MAX_RETRIES,
+    backoff_factor=RETRY_BACKOFF_BASE,
+    backoff_max=RETRY_BACKOFF_CAP,
+    backoff_jitter=RETRY_BACKOFF_BASE,
+    status_forcelist=RETRY_STATUS_CODES,
+    allowed_methods=frozenset({"POST"}),  # Every API call is a POST
+    respect_retry_after_header=True,
+    raise_on_status=False,  # Hand the last response back so raise_for_status reports it
+)
+_SESSION: requests.Session = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=_RETRY))
+
+# Whether the next rankings request may send only the query hash, and whether
+# the server supports persisted queries at all.
+_APQ_STATE: Dict[str, bool] = {"hash_only": False, "supported": True}
+
+# In-memory copy of the token cache, populated from TOKEN_CACHE_FILE on first use.
+_TOKEN_CACHE: Dict[str, Any] = {"token": None, "exp": 0.0}
+
+def _atomic_write_json(path: str, payload: Any) -> None:
+    """
+    Writes JSON to a file atomically so readers never see a partial file.
+
+    Args:
+        path: The destination file path.
+        payload: The JSON-serializable object to write.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(orjson.dumps(payload))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _retry_delay(attempt: int, retry_after: Optional[str]) -> float:
+    """
+    Computes how long to wait before retrying a throttled or failed request.
+
+    Args:
+        attempt: The zero-based number of the attempt that just failed.
+        retry_after: The value of the response's Retry-After header, if any.
+
+    Returns:
+        The delay in seconds: the Retry-After value when it is numeric,
+        otherwise an exponential backoff with jitter. Both are capped at
+        RETRY_BACKOFF_CAP so one response cannot stall a whole batch.
+    """
+    if retry_after:
+        try:
+            return min(RETRY_BACKOFF_CAP, max(0.0, float(retry_after)))
+        except ValueError:
+            pass  # HTTP-date values fall back to the exponential backoff
+    return min(RETRY_BACKOFF_CAP, RETRY_BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+def _get_cached_token(client_id: str) -> Optional[str]:
+    """
+    Returns the cached access token for the given client if it is still valid.
+
+    Args:
+        client_id: The client ID the token must have been issued for.
+
+    Returns:
+        The cached access token, or None if there is no usable token.
+    """
+    if _TOKEN_CACHE["token"] is None:
+        try:
+            with open(TOKEN_CACHE_FILE, "rb") as f:
+                cached: Any = orjson.loads(f.read())
+        except (OSError, ValueError):
+            return None
+        # Ignore anything that does not look like a file written by _store_token
+        if (
+            not isinstance(cached, dict)
+            or not isinstance(cached.get("token"), str)
+            or not isinstance(cached.get("exp"), (int, float))
+            or isinstance(cached.get("exp"), bool)
+        ):
+            return None
+        _TOKEN_CACHE.update(token=cached["token"], exp=float(cached["exp"]), client_id=cached.get("client_id"))
+
+    if _TOKEN_CACHE.get("client_id") == client_id and time.time() < _TOKEN_CACHE["exp"] - TOKEN_EXPIRY_MARGIN:
+        return _TOKEN_CACHE["token"]
+    return None
+
+def _store_token(client_id: str, token: str, expires_in: float) -> None:
+    """
+    Caches an access token in memory and persists it to TOKEN_CACHE_FILE.
+
+    Args:
+        client_id: The client ID the token was issued for.
+        token: The access token.
+        expires_in: The token lifetime in seconds, as reported by the API.
+    """
+    _TOKEN_CACHE.update(token=token, exp=time.time() + expires_in, client_id=client_id)
+    try:
+        _atomic_write_json(TOKEN_CACHE_FILE, _TOKEN_CACHE)
+    except OSError as e:
+        logger.warning("Error saving access token cache: %s", e)
+
 def get_access_token(client_id: Optional[str], client_secret: Optional[str]) -> Optional[str]:
     """
     Authenticates with the Warcraft Logs API to get an access token.
 
+    A previously issued token is reused until shortly before it expires.
+
     Args:
         client_id: The client ID for the Warcraft Logs API.
         client_secret: The client secret for the Warcraft Logs API.
@@ -34,28 +205,242 @@ def get_access_token(client_id: Optional[str], client_secret: Optional[str]) ->
         The access token string if successful, None otherwise.
     """
     if not client_id or not client_secret:
-        print("Client ID or Client Secret not found in environment variables.")
+        logger.error("Client ID or Client Secret not found in environment variables.")
         return None
 
+    cached_token: Optional[str] = _get_cached_token(client_id)
+    if cached_token:
+        return cached_token
+
     try:
         data: Dict[str, str] = {"grant_type": "client_credentials"}
         auth: tuple[str, str] = (client_id, client_secret)
-        response: requests.Response = requests.post(TOKEN_URL, data=data, auth=auth)
+        response: requests.Response = _SESSION.post(TOKEN_URL, data=data, auth=auth)
         response.raise_for_status()  # Raise an exception for bad status codes
-        return response.json().get("access_token")
+        token_data: Dict[str, Any] = orjson.loads(response.content)
+        access_token: Optional[str] = token_data.get("access_token")
+        expires_in: Optional[float] = token_data.get("expires_in")
+        if access_token and expires_in:
+            _store_token(client_id, access_token, expires_in)
+        return access_token
     except requests.exceptions.RequestException as e:
-        print(f"Error getting access token: {e}")
-        if e.response:
-            print(f"Response content: {e.response.text}")
+        logger.error("Error getting access token: %s", e)
+        if e.response is not None:
+            logger.error("Response content: %s", e.response.text)
         return None
-    except json.JSONDecodeError:
-        print("Error decoding JSON from token response.")
+    except orjson.JSONDecodeError:
+        logger.error("Error decoding JSON from token response.")
         return None
 
+def _rankings_cache_path(encounter_id: int, difficulty: int, metric: str) -> str:
+    """
+    Returns the cache file path for a rankings query.
+
+    Args:
+        encounter_id: The ID of the encounter (boss).
+        difficulty: The difficulty of the encounter (e.g., 5 for Mythic).
+        metric: The metric to rank by (e.g., "dps", "hps").
+
+    Returns:
+        The path of the JSON file holding the cached response.
+    """
+    key = hashlib.sha1(f"{encounter_id}:{difficulty}:{metric}".encode(), usedforsecurity=False).hexdigest()
+    return os.path.join(RANKINGS_CACHE_DIR, f"{key}.json")
+
+def _load_cached_rankings(cache_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Loads a cached rankings response if it is younger than RANKINGS_CACHE_TTL.
+
+    Args:
+        cache_path: The cache file path from _rankings_cache_path.
+
+    Returns:
+        The cached API response, or None on a cache miss.
+    """
+    try:
+        if os.path.getmtime(cache_path) <= time.time() - RANKINGS_CACHE_TTL:
+            return None
+        with open(cache_path, "rb") as f:
+            return orjson.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+def _store_cached_rankings(cache_path: str, api_response: Dict[str, Any]) -> None:
+    """
+    Writes a successful rankings response to the cache.
+
+    Responses carrying GraphQL errors are not cached.
+
+    Args:
+        cache_path: The cache file path from _rankings_cache_path.
+        api_response: The API response to cache.
+    """
+    if not isinstance(api_response, dict) or "errors" in api_response:
+        return
+    try:
+        _atomic_write_json(cache_path, api_response)
+    except OSError as e:
+        logger.warning("Error saving rankings cache: %s", e)
+
+def _build_rankings_request(token: str, encounter_id: int, difficulty: int, metric: str, include_query: bool = True) -> tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Builds the GraphQL payload and headers for a rankings request.
+
+    The payload always carries the persisted query hash so the server can
+    register the document.
+
+    Args:
+        token: The access token for the Warcraft Logs API.
+        encounter_id: The ID of the encounter (boss).
+        difficulty: The difficulty of the encounter (e.g., 5 for Mythic).
+        metric: The metric to rank by (e.g., "dps", "hps").
+        include_query: Whether to send the full query text or only its hash.
+
+    Returns:
+        A (payload, headers) tuple ready to be posted to API_URL.
+    """
+    variables: Dict[str, Any] = {
+        "encounterID": encounter_id,
+        "difficulty": difficulty,
+        "metric": metric,
+        "page": RANKINGS_PAGE
+    }
+
+    payload: Dict[str, Any] = {"variables": variables, "extensions": PERSISTED_QUERY_EXTENSIONS}
+    if include_query:
+        payload["query"] = RANKINGS_QUERY
+
+    return payload, _auth_headers(token)
+
+def _persisted_query_error(api_response: Any) -> Optional[str]:
+    """
+    Finds a persisted query error in a GraphQL response.
+
+    Args:
+        api_response: The decoded response to a hash-only request.
+
+    Returns:
+        "not_found" if the server does not know the query hash yet,
+        "not_supported" if it does not support persisted queries at all,
+        or None if the response carries no persisted query error.
+    """
+    errors = api_response.get("errors") if isinstance(api_response, dict) else None
+    for error in errors if isinstance(errors, list) else []:
+        if not isinstance(error, dict):
+            continue
+        code = (error.get("extensions") or {}).get("code")
+        message = str(error.get("message"))
+        if code == "PERSISTED_QUERY_NOT_SUPPORTED" or "PersistedQueryNotSupported" in message:
+            return "not_supported"
+        if code == "PERSISTED_QUERY_NOT_FOUND" or "PersistedQueryNotFound" in message:
+            return "not_found"
+    return None
+
+def _post_rankings_query(token: str, encounter_id: int, difficulty: int, metric: str) -> Dict[str, Any]:
+    """
+    Posts the rankings query, sending only its hash once the server knows it.
+
+    A hash-only request that comes back with errors and no data (or a 400
+    with a non-JSON body) is re-sent as the full document in the same call,
+    so callers never see a rejection of the hash-only form. If the full
+    document then succeeds after anything but a "not found" error, the
+    server is taken not to support persisted queries and only full
+    documents are sent from then on.
+
+    Args:
+        token: The access token for the Warcraft Logs API.
+        encounter_id: The ID of the encounter (boss).
+        difficulty: The difficulty of the encounter (e.g., 5 for Mythic).
+        metric: The metric to rank by (e.g., "dps", "hps").
+
+    Returns:
+        The decoded API response.
+
+    Raises:
+        requests.exceptions.RequestException: If the request fails.
+        orjson.JSONDecodeError: If the response is not valid JSON.
+    """
+    apq_error: Optional[str] = None
+    if _APQ_STATE["hash_only"]:
+        payload, headers = _build_rankings_request(token, encounter_id, difficulty, metric, include_query=False)
+        response: requests.Response = _SESSION.post(API_URL, data=orjson.dumps(payload), headers=headers)
+        if response.status_code != 400:  # Some servers reject the hash-only form with a 400
+            response.raise_for_status()
+        try:
+            api_response: Dict[str, Any] = orjson.loads(response.content)
+        except orjson.JSONDecodeError:
+            if response.status_code != 400:
+                raise
+            api_response = {"errors": []}  # A bare 400 means the hash-only form was not understood
+
+        if "errors" not in api_response or api_response.get("data"):
+            response.raise_for_status()
+            return api_response
+
+        # Errors without data: retry as the full document before reporting anything
+        apq_error = _persisted_query_error(api_response) or "rejected"
+        _APQ_STATE["hash_only"] = False
+
+    payload, headers = _build_rankings_request(token, encounter_id, difficulty, metric)
+    response = _SESSION.post(API_URL, data=orjson.dumps(payload), headers=headers)
+    response.raise_for_status()
+    api_response = orjson.loads(response.content)
+    if "errors" in api_response:
+        return api_response
+    if apq_error not in (None, "not_found"):
+        # The full document worked where its hash did not, so the server lacks persisted queries
+        _APQ_STATE["supported"] = False
+    # The server has now seen the full document, so the next call can try just its hash
+    _APQ_STATE["hash_only"] = _APQ_STATE["supported"]
+    return api_response
+
+@functools.lru_cache(maxsize=4)
+def _auth_headers(token: str) -> Dict[str, str]:
+    """
+    Builds the headers for an authenticated GraphQL request.
+
+    The result is memoised per token, so repeated calls with the same token
+    share one dictionary; callers must not mutate it.
+
+    Args:
+        token: The access token for the Warcraft Logs API.
+
+    Returns:
+        A dictionary of HTTP headers.
+    """
+    return {**_BASE_HEADERS, "Authorization": f"Bearer {token}"}
+
+@functools.lru_cache(maxsize=32)
+def _build_batched_rankings_query(count: int) -> str:
+    """
+    Builds one GraphQL document that selects the rankings of several encounters.
+
+    Each encounter is selected under its own alias (e0, e1, ...) so that the
+    whole batch is resolved in a single request.
+
+    Args:
+        count: The number of encounters in the batch.
+
+    Returns:
+        The GraphQL query string, taking $e0..$e{count-1} encounter IDs.
+    """
+    encounter_vars = "".join(f", $e{i}: Int!" for i in range(count))
+    selections = "\n".join(
+        f"    e{i}: encounter(id: $e{i}) {{ name characterRankings(metric: $metric, difficulty: $difficulty, page: $page) }}"
+        for i in range(count)
+    )
+    return (
+        f"query($difficulty: Int!, $metric: CharacterRankingMetricType!, $page: Int!{encounter_vars}) {{\n"
+        f"  worldData {{\n{selections}\n  }}\n"
+        "}"
+    )
+
 def get_dps_rankings(token: str, encounter_id: int, difficulty: int, metric: str) -> Optional[Dict[str, Any]]:
     """
     Fetches the top DPS rankings for a specific encounter from Warcraft Logs API.
 
+    Responses are served from the on-disk cache while it is fresh.
+
     Args:
         token: The access token for the Warcraft Logs API.
         encounter_id: The ID of the encounter (boss).
@@ -66,45 +451,176 @@ def get_dps_rankings(token: str, encounter_id: int, difficulty: int, metric: str
         A dictionary containing the API response data, or None if an error occurs.
     """
     if not token:
-        print("Cannot fetch rankings without an access token.")
-        return None
-
-    # GraphQL query to fetch the rankings
-    query: str = """
-        query($encounterID: Int!, $difficulty: Int!, $metric: CharacterRankingMetricType!) {
-          worldData {
-            encounter(id: $encounterID) {
-              name
-              characterRankings(metric: $metric, difficulty: $difficulty)
-            }
-          }
-        }
-        """
+        logger.error("Cannot fetch rankings without an access token.")
+        return None
 
-    variables: Dict[str, Any] = {
-        "encounterID": encounter_id,
-        "difficulty": difficulty,
-        "metric": metric
-    }
+    cache_path: str = _rankings_cache_path(encounter_id, difficulty, metric)
+    cached_response: Optional[Dict[str, Any]] = _load_cached_rankings(cache_path)
+    if cached_response is not None:
+        return cached_response
 
-    headers: Dict[str, str] = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
+    try:
+        api_response: Dict[str, Any] = _post_rankings_query(token, encounter_id, difficulty, metric)
+        _store_cached_rankings(cache_path, api_response)
+        return api_response
+    except requests.exceptions.RequestException as e:
+        logger.error("Error fetching rankings: %s", e)
+        if e.response is not None:
+            logger.error("Response content: %s", e.response.text)
+        return None
+    except orjson.JSONDecodeError:
+        logger.error("Error decoding JSON from rankings response.")
+        return None
+
+def get_dps_rankings_batch(token: str, encounter_ids: List[int], difficulty: int, metric: str) -> Optional[Dict[int, Dict[str, Any]]]:
+    """
+    Fetches the rankings for several encounters in a single GraphQL request.
+
+    Args:
+        token: The access token for the Warcraft Logs API.
+        encounter_ids: The IDs of the encounters (bosses) to fetch.
+        difficulty: The difficulty of the encounters (e.g., 5 for Mythic).
+        metric: The metric to rank by (e.g., "dps", "hps").
+
+    Returns:
+        A dictionary mapping each encounter ID to a response shaped like the
+        one returned by get_dps_rankings, or None if an error occurs.
+    """
+    if not token:
+        logger.error("Cannot fetch rankings without an access token.")
+        return None
+
+    unique_ids: List[int] = list(dict.fromkeys(encounter_ids))
+    if not unique_ids:
+        return {}
+
+    variables: Dict[str, Any] = {"difficulty": difficulty, "metric": metric, "page": RANKINGS_PAGE}
+    variables.update((f"e{i}", encounter_id) for i, encounter_id in enumerate(unique_ids))
+    payload: Dict[str, Any] = {"query": _build_batched_rankings_query(len(unique_ids)), "variables": variables}
 
     try:
-        response: requests.Response = requests.post(API_URL, json={"query": query, "variables": variables}, headers=headers)
+        response: requests.Response = _SESSION.post(API_URL, data=orjson.dumps(payload), headers=_auth_headers(token))
         response.raise_for_status()
-        return response.json()
+        world_data: Dict[str, Any] = (orjson.loads(response.content).get("data") or {}).get("worldData") or {}
     except requests.exceptions.RequestException as e:
-        print(f"Error fetching rankings: {e}")
-        if e.response:
-            print(f"Response content: {e.response.text}")
+        logger.error("Error fetching batched rankings: %s", e)
+        if e.response is not None:
+            logger.error("Response content: %s", e.response.text)
+        return None
+    except orjson.JSONDecodeError:
+        logger.error("Error decoding JSON from batched rankings response.")
+        return None
+
+    # Split the aliased selections back into one response per encounter
+    return {
+        encounter_id: {"data": {"worldData": {"encounter": world_data.get(f"e{i}")}}}
+        for i, encounter_id in enumerate(unique_ids)
+    }
+
+async def get_dps_rankings_async(client: httpx.AsyncClient, token: str, encounter_id: int, difficulty: int, metric: str) -> Optional[Dict[str, Any]]:
+    """
+    Asynchronously fetches the top DPS rankings for a specific encounter.
+
+    Args:
+        client: The httpx client used to send the request.
+        token: The access token for the Warcraft Logs API.
+        encounter_id: The ID of the encounter (boss).
+        difficulty: The difficulty of the encounter (e.g., 5 for Mythic).
+        metric: The metric to rank by (e.g., "dps", "hps").
+
+    Returns:
+        A dictionary containing the API response data, or None if an error occurs.
+    """
+    if not token:
+        logger.error("Cannot fetch rankings without an access token.")
+        return None
+
+    cache_path: str = _rankings_cache_path(encounter_id, difficulty, metric)
+    cached_response: Optional[Dict[str, Any]] = _load_cached_rankings(cache_path)
+    if cached_response is not None:
+        return cached_response
+
+    payload, headers = _build_rankings_request(token, encounter_id, difficulty, metric)
+
+    try:
+        for attempt in range(MAX_RETRIES + 1):
+            response: httpx.Response = await client.post(API_URL, content=orjson.dumps(payload), headers=headers)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == MAX_RETRIES:
+                break
+            await asyncio.sleep(_retry_delay(attempt, response.headers.get("Retry-After")))
+        response.raise_for_status()
+        api_response: Dict[str, Any] = orjson.loads(response.content)
+        _store_cached_rankings(cache_path, api_response)
+        return api_response
+    except httpx.HTTPStatusError as e:
+        logger.error("Error fetching rankings for encounter %s: %s", encounter_id, e)
+        logger.error("Response content: %s", e.response.text)
+        return None
+    except httpx.HTTPError as e:
+        logger.error("Error fetching rankings for encounter %s: %s", encounter_id, e)
         return None
-    except json.JSONDecodeError:
-        print("Error decoding JSON from rankings response.")
+    except orjson.JSONDecodeError:
+        logger.error("Error decoding JSON from rankings response for encounter %s.", encounter_id)
         return None
 
+async def fetch_many(token: str, encounter_ids: List[int], difficulty: int = DIFFICULTY, metric: str = METRIC) -> Dict[int, Optional[Dict[str, Any]]]:
+    """
+    Fetches the rankings for several encounters concurrently over one HTTP/2 client.
+
+    Args:
+        token: The access token for the Warcraft Logs API.
+        encounter_ids: The IDs of the encounters (bosses) to fetch.
+        difficulty: The difficulty of the encounters (e.g., 5 for Mythic).
+        metric: The metric to rank by (e.g., "dps", "hps").
+
+    Returns:
+        A dictionary mapping each encounter ID to its API response, or None
+        for encounters whose request failed.
+    """
+    unique_ids: List[int] = list(dict.fromkeys(encounter_ids))
+    limits = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+    # HTTP/2 multiplexes the whole batch as concurrent streams over one connection
+    async with httpx.AsyncClient(http2=True, limits=limits, timeout=httpx.Timeout(10.0)) as client:
+        responses = await asyncio.gather(
+            *(get_dps_rankings_async(client, token, encounter_id, difficulty, metric) for encounter_id in unique_ids)
+        )
+    return dict(zip(unique_ids, responses))
+
+def get_many_dps_rankings(token: str, encounter_ids: List[int], difficulty: int = DIFFICULTY, metric: str = METRIC, max_workers: int = 8) -> Dict[int, Optional[Dict[str, Any]]]:
+    """
+    Fetches the rankings for several encounters concurrently using threads.
+
+    A synchronous alternative to fetch_many. Each worker calls get_dps_rankings,
+    so requests share the pooled Session, the retry policy and the on-disk
+    cache. The worker count is capped at HTTP_POOL_MAXSIZE so that every
+    worker can keep its connection alive in the pool.
+
+    Args:
+        token: The access token for the Warcraft Logs API.
+        encounter_ids: The IDs of the encounters (bosses) to fetch.
+        difficulty: The difficulty of the encounters (e.g., 5 for Mythic).
+        metric: The metric to rank by (e.g., "dps", "hps").
+        max_workers: The maximum number of requests in flight at once, up to
+            HTTP_POOL_MAXSIZE.
+
+    Returns:
+        A dictionary mapping each encounter ID to its API response, or None
+        for encounters whose request failed.
+    """
+    unique_ids: List[int] = list(dict.fromkeys(encounter_ids))
+    results: Dict[int, Optional[Dict[str, Any]]] = dict.fromkeys(unique_ids)
+    if not unique_ids:
+        return results
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, HTTP_POOL_MAXSIZE))) as executor:
+        futures = {
+            executor.submit(get_dps_rankings, token, encounter_id, difficulty, metric): encounter_id
+            for encounter_id in unique_ids
+        }
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return results
+
 def parse_rankings_response(api_response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """
     Parses the raw API response to extract encounter name and character rankings.
@@ -116,9 +632,15 @@ def parse_rankings_response(api_response: Dict[str, Any]) -> Optional[Dict[str,
         A dictionary containing 'encounter_name' and 'rankings' (list of dicts),
         or None if the expected data structure is not found.
     """
-    encounter_data: Dict[str, Any] = api_response.get('data', {}).get('worldData', {}).get('encounter', {})
+    # Optimistic lookup: no throwaway default dicts on the happy path, and a
+    # null 'data' (as sent alongside GraphQL errors) lands in the except branch.
+    try:
+        encounter_data: Optional[Dict[str, Any]] = api_response['data']['worldData']['encounter']
+    except (KeyError, TypeError):
+        encounter_data = None
+
     if not encounter_data:
-        print("Could not find encounter data in the API response.")
+        logger.error("Could not find encounter data in the API response.")
         return None
 
     encounter_name: Optional[str] = encounter_data.get('name')
@@ -126,19 +648,41 @@ def parse_rankings_response(api_response: Dict[str, Any]) -> Optional[Dict[str,
     rankings_json_string: Optional[str] = encounter_data.get('characterRankings')
 
     if not rankings_json_string:
-        print("No character rankings found in the API response.")
+        logger.error("No character rankings found in the API response.")
         return None
 
     try:
         # Parse the JSON string within 'characterRankings'
-        parsed_rankings: Dict[str, Any] = json.loads(rankings_json_string)
-        # Get the list of ranks and limit to the top 10.
-        ranks: List[Dict[str, Any]] = parsed_rankings.get('rankings', [])[:10]
+        parsed_rankings: Dict[str, Any] = orjson.loads(rankings_json_string)
+        # Get the list of ranks and keep only the top entries.
+        ranks: List[Dict[str, Any]] = parsed_rankings.get('rankings', [])[:RANKINGS_LIMIT]
         return {"encounter_name": encounter_name, "rankings": ranks}
-    except json.JSONDecodeError:
-        print("Error decoding characterRankings JSON string.")
+    except orjson.JSONDecodeError:
+        logger.error("Error decoding characterRankings JSON string.")
         return None
 
+def _format_ranking_row(position: int, rank_info: Dict[str, Any]) -> str:
+    """
+    Formats a single ranking as a Markdown table row.
+
+    Args:
+        position: The 1-based position of the ranking, used if 'rank' is missing.
+        rank_info: A dictionary representing a player's ranking.
+
+    Returns:
+        The Markdown table row, without a trailing newline.
+    """
+    return MARKDOWN_ROW_FORMAT.format(
+        rank=rank_info.get('rank', position),
+        name=rank_info.get('name', 'N/A'),
+        amount=rank_info.get('amount', 0.0),
+        cls=rank_info.get('class', 'N/A'),
+        spec=rank_info.get('spec', 'N/A'),
+        guild=(rank_info.get('guild') or {}).get('name', 'N/A'),
+        server=(rank_info.get('server') or {}).get('name', 'N/A'),
+        report=(rank_info.get('report') or {}).get('code', 'N/A')
+    )
+
 def format_rankings_as_markdown(encounter_name: str, rankings: List[Dict[str, Any]]) -> str:
     """
     Formats the character rankings as a Markdown table.
@@ -153,53 +697,51 @@ def format_rankings_as_markdown(encounter_name: str, rankings: List[Dict[str, An
     if not rankings:
         return "No rankings to display.\n"
 
-    markdown_output = []
-
-    # Title
-    markdown_output.append(f"## Top {len(rankings)} DPS Rankings for {encounter_name} (Mythic)\n")
+    return "\n".join(iter_rankings_markdown(encounter_name, rankings))
 
-    # Headers
-    headers: List[str] = ["Rank", "Player", "DPS", "Class", "Spec", "Guild", "Server", "Report"]
-    markdown_output.append(" | ".join(headers))
+def iter_rankings_markdown(encounter_name: str, rankings: List[Dict[str, Any]]) -> Iterator[str]:
+    """
+    Lazily yields the lines of the Markdown rankings table.
 
-    # Separator
-    markdown_output.append(" | ".join(["---"] * len(headers)))
+    Lets large tables be written with save_markdown_output without building
+    the whole document in memory first.
 
-    # Rows
-    for idx, rank_info in enumerate(rankings):
-        display_rank = str(rank_info.get('rank', idx + 1)) # Use index + 1 if 'rank' is missing
-        guild_name: str = rank_info.get('guild', {}).get('name', 'N/A')
-        server_name: str = rank_info.get('server', {}).get('name', 'N/A')
-        report_code: str = rank_info.get('report', {}).get('code', 'N/A')
+    Args:
+        encounter_name: The name of the encounter.
+        rankings: A list of dictionaries, each representing a player's ranking.
 
-        row_data = [
-            display_rank,
-            rank_info.get('name', 'N/A'),
-            f"{rank_info.get('amount', 0.0):.2f}",
-            rank_info.get('class', 'N/A'),
-            rank_info.get('spec', 'N/A'),
-            guild_name,
-            server_name,
-            report_code
-        ]
-        markdown_output.append(" | ".join(map(str, row_data)))
+    Yields:
+        The title, the header and separator lines, then one line per ranking;
+        or a single placeholder line when there are no rankings.
+    """
+    if not rankings:
+        yield "No rankings to display."
+        return
 
-    return "\n".join(markdown_output)
+    yield f"## Top {len(rankings)} DPS Rankings for {encounter_name} (Mythic)\n"
+    yield MARKDOWN_TABLE_HEADER
+    yield from map(_format_ranking_row, itertools.count(1), rankings)
 
-def save_markdown_output(content: str, filename: str = "rankings.md") -> None:
+def save_markdown_output(content: Union[str, Iterable[str]], filename: str = "rankings.md") -> None:
     """
     Saves the given content to a Markdown file.
 
     Args:
-        content: The string content to save.
+        content: The string content to save, or an iterable of lines (such as
+            iter_rankings_markdown) that is written one line at a time.
         filename: The name of the file to save to.
     """
     try:
         with open(filename, "w", encoding="utf-8") as f:
-            f.write(content)
-        print(f"Rankings saved to {filename}")
+            if isinstance(content, str):
+                f.write(content)
+            else:
+                for line in content:
+                    f.write(line)
+                    f.write("\n")
+        logger.info("Rankings saved to %s", filename)
     except IOError as e:
-        print(f"Error saving markdown output to file: {e}")
+        logger.error("Error saving markdown output to file: %s", e)
 
 def main() -> None:
     """
@@ -215,9 +757,8 @@ def main() -> None:
         if api_response:
             parsed_data: Optional[Dict[str, Any]] = parse_rankings_response(api_response)
             if parsed_data:
-                markdown_table = format_rankings_as_markdown(parsed_data["encounter_name"], parsed_data["rankings"])
-                
-                save_markdown_output(markdown_table)
+                markdown_lines = iter_rankings_markdown(parsed_data["encounter_name"], parsed_data["rankings"])
+                save_markdown_output(markdown_lines)
             else:
                 print("Failed to parse rankings data.")
         else:
@@ -226,4 +767,5 @@ def main() -> None:
         print("Failed to obtain access token. Please check your credentials.")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
     main()
\ No newline at end of file
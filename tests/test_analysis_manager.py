@@ -1,15 +1,25 @@
+import asyncio
+import httpx
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 import json
+import logging
 import os
+import time
 
 # Import the functions from the module to be tested
 import requests
+from src.manager import analysis_manager
 from src.manager.analysis_manager import (
     get_access_token,
     get_dps_rankings,
+    get_dps_rankings_async,
+    get_dps_rankings_batch,
+    get_many_dps_rankings,
+    fetch_many,
     parse_rankings_response,
     format_rankings_as_markdown,
+    iter_rankings_markdown,
     save_markdown_output,
     main
 )
@@ -23,42 +33,112 @@ def mock_env_vars():
     }):
         yield
 
+# Keep the token cache isolated per test and away from the real home directory
+@pytest.fixture(autouse=True)
+def isolated_token_cache(tmp_path, monkeypatch):
+    cache_file = tmp_path / "wcl_token.json"
+    monkeypatch.setattr(analysis_manager, "TOKEN_CACHE_FILE", str(cache_file))
+    monkeypatch.setattr(analysis_manager, "_TOKEN_CACHE", {"token": None, "exp": 0.0})
+    return cache_file
+
+# Keep cached rankings isolated per test
+@pytest.fixture(autouse=True)
+def isolated_rankings_cache(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "rankings"
+    monkeypatch.setattr(analysis_manager, "RANKINGS_CACHE_DIR", str(cache_dir))
+    return cache_dir
+
+# Start every test without a registered persisted query
+@pytest.fixture(autouse=True)
+def reset_persisted_query_state(monkeypatch):
+    monkeypatch.setattr(analysis_manager, "_APQ_STATE", {"hash_only": False, "supported": True})
+
+# Build a mocked requests.Response whose body is the given payload
+@pytest.fixture
+def make_response():
+    def _make_response(payload=None, status_code=200, error=None):
+        response = MagicMock()
+        response.status_code = status_code
+        response.content = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        if error:
+            response.raise_for_status.side_effect = error
+        else:
+            response.raise_for_status.return_value = None
+        return response
+    return _make_response
+
+# Patch the shared session's post method
+@pytest.fixture
+def mock_post():
+    with patch('src.manager.analysis_manager._SESSION.post') as mocked_post:
+        yield mocked_post
+
 # --- Tests for get_access_token ---
 
-def test_get_access_token_success():
-    mock_response = MagicMock()
-    mock_response.status_code = 200
-    mock_response.json.return_value = {"access_token": "mock_token"}
-    mock_response.raise_for_status.return_value = None
-
-    with patch('requests.post', return_value=mock_response) as mock_post:
-        token = get_access_token("mock_client_id", "mock_client_secret")
-        assert token == "mock_token"
-        mock_post.assert_called_once()
-
-def test_get_access_token_invalid_credentials():
-    mock_response = MagicMock()
-    mock_response.status_code = 401
-    mock_response.raise_for_status.side_effect = requests.exceptions.HTTPError("401 Client Error")
-
-    with patch('requests.post', return_value=mock_response):
-        token = get_access_token("invalid_client_id", "invalid_client_secret")
-        assert token is None
-
-def test_get_access_token_network_error():
-    with patch('requests.post', side_effect=requests.exceptions.RequestException("Network error")):
-        token = get_access_token("mock_client_id", "mock_client_secret")
-        assert token is None
-
-def test_get_access_token_json_decode_error():
-    mock_response = MagicMock()
-    mock_response.status_code = 200
-    mock_response.json.side_effect = json.JSONDecodeError("Invalid JSON", "", 0)
-    mock_response.raise_for_status.return_value = None
-
-    with patch('requests.post', return_value=mock_response):
-        token = get_access_token("mock_client_id", "mock_client_secret")
-        assert token is None
+def test_get_access_token_success(mock_post, make_response):
+    mock_post.return_value = make_response({"access_token": "mock_token"})
+
+    token = get_access_token("mock_client_id", "mock_client_secret")
+    assert token == "mock_token"
+    mock_post.assert_called_once()
+
+@pytest.mark.parametrize("response_kwargs, post_error", [
+    pytest.param({"status_code": 401, "error": requests.exceptions.HTTPError("401 Client Error")}, None, id="invalid_credentials"),
+    pytest.param(None, requests.exceptions.RequestException("Network error"), id="network_error"),
+    pytest.param({"payload": b"invalid json"}, None, id="json_decode_error"),
+])
+def test_get_access_token_failures(mock_post, make_response, response_kwargs, post_error):
+    if post_error:
+        mock_post.side_effect = post_error
+    else:
+        mock_post.return_value = make_response(**response_kwargs)
+
+    token = get_access_token("mock_client_id", "mock_client_secret")
+    assert token is None
+
+def test_get_access_token_reuses_cached_token(mock_post, isolated_token_cache, make_response):
+    mock_post.return_value = make_response({"access_token": "mock_token", "expires_in": 3600})
+
+    assert get_access_token("mock_client_id", "mock_client_secret") == "mock_token"
+    assert get_access_token("mock_client_id", "mock_client_secret") == "mock_token"
+    mock_post.assert_called_once()
+
+    cached = json.loads(isolated_token_cache.read_text(encoding="utf-8"))
+    assert cached["token"] == "mock_token"
+    assert cached["client_id"] == "mock_client_id"
+
+def test_get_access_token_loads_token_from_disk(mock_post, isolated_token_cache):
+    isolated_token_cache.write_text(json.dumps({
+        "token": "disk_token",
+        "exp": time.time() + 3600,
+        "client_id": "mock_client_id"
+    }), encoding="utf-8")
+
+    assert get_access_token("mock_client_id", "mock_client_secret") == "disk_token"
+    mock_post.assert_not_called()
+
+@pytest.mark.parametrize("cache_contents", [
+    pytest.param({"token": "disk_token", "exp": "soon", "client_id": "mock_client_id"}, id="non_numeric_exp"),
+    pytest.param({"token": 123, "exp": time.time() + 3600, "client_id": "mock_client_id"}, id="non_string_token"),
+    pytest.param(["not", "a", "dict"], id="not_a_dict"),
+])
+def test_get_access_token_ignores_malformed_cache_file(isolated_token_cache, mock_post, make_response, cache_contents):
+    isolated_token_cache.write_text(json.dumps(cache_contents), encoding="utf-8")
+    mock_post.return_value = make_response({"access_token": "fresh_token", "expires_in": 3600})
+
+    assert get_access_token("mock_client_id", "mock_client_secret") == "fresh_token"
+    mock_post.assert_called_once()
+
+def test_get_access_token_refreshes_expired_token(mock_post, isolated_token_cache, make_response):
+    isolated_token_cache.write_text(json.dumps({
+        "token": "stale_token",
+        "exp": time.time() - 1,
+        "client_id": "mock_client_id"
+    }), encoding="utf-8")
+    mock_post.return_value = make_response({"access_token": "fresh_token", "expires_in": 3600})
+
+    assert get_access_token("mock_client_id", "mock_client_secret") == "fresh_token"
+    mock_post.assert_called_once()
 
 def test_get_access_token_missing_env_vars():
     # Test when client_id or client_secret are None (e.g., not set in .env)
@@ -69,45 +149,280 @@ def test_get_access_token_missing_env_vars():
 
 # --- Tests for get_dps_rankings ---
 
-def test_get_dps_rankings_success():
-    mock_response = MagicMock()
-    mock_response.status_code = 200
-    mock_response.json.return_value = {"data": {"worldData": {"encounter": {"name": "Test Boss", "characterRankings": '{"rankings": [{"name": "Player1"}]}'}}}} # Note: characterRankings is a JSON string
-    mock_response.raise_for_status.return_value = None
+def test_get_dps_rankings_success(mock_post, make_response):
+    mock_post.return_value = make_response({"data": {"worldData": {"encounter": {"name": "Test Boss", "characterRankings": '{"rankings": [{"name": "Player1"}]}'}}}}) # Note: characterRankings is a JSON string
+
+    rankings = get_dps_rankings("mock_token", 123, 5, "dps")
+    assert rankings is not None
+    assert "data" in rankings
+    mock_post.assert_called_once()
+
+def test_get_dps_rankings_served_from_cache(mock_post, make_response):
+    mock_post.return_value = make_response({"data": {"worldData": {"encounter": {"name": "Test Boss"}}}})
+
+    first = get_dps_rankings("mock_token", 123, 5, "dps")
+    second = get_dps_rankings("mock_token", 123, 5, "dps")
+    get_dps_rankings("mock_token", 123, 5, "hps")
+    assert first == second
+    assert mock_post.call_count == 2
+
+def test_get_dps_rankings_refetches_expired_cache(mock_post, isolated_rankings_cache, make_response):
+    mock_post.return_value = make_response({"data": {"worldData": {"encounter": {"name": "Test Boss"}}}})
 
-    with patch('requests.post', return_value=mock_response) as mock_post:
-        rankings = get_dps_rankings("mock_token", 123, 5, "dps")
-        assert rankings is not None
-        assert "data" in rankings
-        mock_post.assert_called_once()
+    get_dps_rankings("mock_token", 123, 5, "dps")
+    (cache_file,) = isolated_rankings_cache.iterdir()
+    stale = time.time() - analysis_manager.RANKINGS_CACHE_TTL - 1
+    os.utime(cache_file, (stale, stale))
+    get_dps_rankings("mock_token", 123, 5, "dps")
+    assert mock_post.call_count == 2
+
+def test_get_dps_rankings_does_not_cache_errors(mock_post, isolated_rankings_cache, make_response):
+    mock_post.return_value = make_response({"errors": [{"message": "Boom"}]})
+
+    get_dps_rankings("mock_token", 123, 5, "dps")
+    assert not isolated_rankings_cache.exists()
 
 def test_get_dps_rankings_no_token():
     rankings = get_dps_rankings(None, 123, 5, "dps")
     assert rankings is None
 
-def test_get_dps_rankings_network_error():
-    with patch('requests.post', side_effect=requests.exceptions.RequestException("Network error")):
-        rankings = get_dps_rankings("mock_token", 123, 5, "dps")
-        assert rankings is None
+def test_get_dps_rankings_network_error(mock_post):
+    mock_post.side_effect = requests.exceptions.RequestException("Network error")
+
+    rankings = get_dps_rankings("mock_token", 123, 5, "dps")
+    assert rankings is None
+
+def test_get_dps_rankings_http_error(mock_post, make_response):
+    mock_post.return_value = make_response(status_code=500, error=requests.exceptions.HTTPError("500 Server Error"))
+
+    rankings = get_dps_rankings("mock_token", 123, 5, "dps")
+    assert rankings is None
+
+def test_get_dps_rankings_http_error_logs_response_body(mock_post, make_response, caplog):
+    error_response = make_response(b"rate limited", status_code=429)
+    error_response.text = "rate limited"
+    error_response.raise_for_status.side_effect = requests.exceptions.HTTPError("429 Client Error", response=error_response)
+    mock_post.return_value = error_response
+
+    assert get_dps_rankings("mock_token", 123, 5, "dps") is None
+    assert "Response content: rate limited" in caplog.messages
+
+def test_get_dps_rankings_json_decode_error(mock_post, make_response):
+    mock_post.return_value = make_response(b"invalid json")
+
+    rankings = get_dps_rankings("mock_token", 123, 5, "dps")
+    assert rankings is None
+
+def test_get_dps_rankings_sends_only_hash_once_registered(mock_post, make_response):
+    mock_post.return_value = make_response({"data": {"worldData": {"encounter": {"name": "Test Boss"}}}})
+
+    get_dps_rankings("mock_token", 123, 5, "dps")
+    get_dps_rankings("mock_token", 456, 5, "dps")
+
+    first, second = (json.loads(call.kwargs["data"]) for call in mock_post.call_args_list)
+    assert first["query"] == analysis_manager.RANKINGS_QUERY
+    assert "query" not in second
+    assert second["extensions"]["persistedQuery"]["sha256Hash"] == analysis_manager.RANKINGS_QUERY_HASH
+
+def test_get_dps_rankings_resends_query_when_hash_unknown(mock_post, make_response):
+    analysis_manager._APQ_STATE["hash_only"] = True
+    mock_post.side_effect = [
+        make_response({"errors": [{"message": "PersistedQueryNotFound"}]}),
+        make_response({"data": {"worldData": {"encounter": {"name": "Test Boss"}}}}),
+    ]
+
+    rankings = get_dps_rankings("mock_token", 123, 5, "dps")
+
+    assert rankings == {"data": {"worldData": {"encounter": {"name": "Test Boss"}}}}
+    assert "query" in json.loads(mock_post.call_args.kwargs["data"])
+    assert analysis_manager._APQ_STATE == {"hash_only": True, "supported": True}
+
+@pytest.mark.parametrize("rejection", [
+    pytest.param({"payload": {"errors": [{"message": "PersistedQueryNotSupported"}]}}, id="message"),
+    pytest.param({"payload": {"errors": [{"message": "nope", "extensions": {"code": "PERSISTED_QUERY_NOT_SUPPORTED"}}]}, "status_code": 400}, id="code"),
+    pytest.param({"payload": b"<html>Bad Request</html>", "status_code": 400}, id="non_json_400"),
+])
+def test_get_dps_rankings_disables_hash_only_when_unsupported(mock_post, make_response, rejection):
+    analysis_manager._APQ_STATE["hash_only"] = True
+    mock_post.side_effect = [
+        make_response(**rejection),
+        make_response({"data": {"worldData": {"encounter": {"name": "Test Boss"}}}}),
+    ]
+
+    assert get_dps_rankings("mock_token", 123, 5, "dps") is not None
+    assert mock_post.call_count == 2
+    assert analysis_manager._APQ_STATE == {"hash_only": False, "supported": False}
+
+def test_get_dps_rankings_falls_back_when_server_ignores_persisted_queries(mock_post, make_response):
+    missing_query = {"errors": [{"message": 'GraphQL Request must include at least one of those two parameters: "query" or "queryId"'}]}
+    success = {"data": {"worldData": {"encounter": {"name": "Test Boss"}}}}
+    mock_post.side_effect = lambda url, data, headers: make_response(
+        success if "query" in json.loads(data) else missing_query
+    )
+
+    for encounter_id in range(1, 7):
+        assert get_dps_rankings("mock_token", encounter_id, 5, "dps") == success
+
+    # One hash-only probe is rejected and retried in full; every later call sends the full document
+    assert mock_post.call_count == 7
+    assert analysis_manager._APQ_STATE == {"hash_only": False, "supported": False}
+
+def test_get_dps_rankings_reuses_headers_for_same_token(mock_post, make_response):
+    mock_post.return_value = make_response({"data": {"worldData": {"encounter": {"name": "Test Boss"}}}})
+
+    get_dps_rankings("mock_token", 123, 5, "dps")
+    get_dps_rankings("mock_token", 456, 5, "dps")
+
+    first, second = (call.kwargs["headers"] for call in mock_post.call_args_list)
+    assert first is second
+    assert first == {"Content-Type": "application/json", "Authorization": "Bearer mock_token"}
+
+# --- Tests for get_dps_rankings_batch ---
+
+def test_get_dps_rankings_batch_uses_one_request(mock_post, make_response):
+    mock_post.return_value = make_response({"data": {"worldData": {
+        "e0": {"name": "Boss A", "characterRankings": '{"rankings": []}'},
+        "e1": {"name": "Boss B", "characterRankings": '{"rankings": []}'}
+    }}})
+
+    results = get_dps_rankings_batch("mock_token", [10, 20, 10], 5, "dps")
+
+    mock_post.assert_called_once()
+    payload = json.loads(mock_post.call_args.kwargs["data"])
+    assert payload["variables"] == {"difficulty": 5, "metric": "dps", "page": 1, "e0": 10, "e1": 20}
+    assert "e1: encounter(id: $e1)" in payload["query"]
+    assert results[10] == {"data": {"worldData": {"encounter": {"name": "Boss A", "characterRankings": '{"rankings": []}'}}}}
+    assert parse_rankings_response(results[20])["encounter_name"] == "Boss B"
+
+def test_get_dps_rankings_batch_network_error(mock_post):
+    mock_post.side_effect = requests.exceptions.RequestException("Network error")
+
+    assert get_dps_rankings_batch("mock_token", [10, 20], 5, "dps") is None
+
+def test_get_dps_rankings_batch_empty_and_no_token():
+    assert get_dps_rankings_batch("mock_token", [], 5, "dps") == {}
+    assert get_dps_rankings_batch(None, [10], 5, "dps") is None
+
+# --- Tests for the async rankings helpers ---
+
+def run_with_mock_transport(handler, *args):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await get_dps_rankings_async(client, *args)
+    return asyncio.run(run())
+
+def test_get_dps_rankings_async_success():
+    def handler(request):
+        assert request.headers["Authorization"] == "Bearer mock_token"
+        variables = json.loads(request.content)["variables"]
+        assert variables["encounterID"] == 123
+        assert variables["page"] == 1
+        return httpx.Response(200, json={"data": {"worldData": {"encounter": {"name": "Test Boss"}}}})
+
+    rankings = run_with_mock_transport(handler, "mock_token", 123, 5, "dps")
+    assert rankings == {"data": {"worldData": {"encounter": {"name": "Test Boss"}}}}
+
+def test_get_dps_rankings_async_http_error():
+    rankings = run_with_mock_transport(lambda request: httpx.Response(400, text="boom"), "mock_token", 123, 5, "dps")
+    assert rankings is None
+
+def test_get_dps_rankings_async_no_token():
+    rankings = run_with_mock_transport(lambda request: httpx.Response(200, json={}), None, 123, 5, "dps")
+    assert rankings is None
+
+def test_get_dps_rankings_async_retries_after_rate_limit():
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "0"}),
+        httpx.Response(200, json={"data": {}}),
+    ]
+    rankings = run_with_mock_transport(lambda request: responses.pop(0), "mock_token", 123, 5, "dps")
+    assert rankings == {"data": {}}
+    assert responses == []
+
+def test_get_dps_rankings_async_gives_up_after_max_retries():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    with patch('src.manager.analysis_manager.asyncio.sleep', new=AsyncMock()):
+        rankings = run_with_mock_transport(handler, "mock_token", 123, 5, "dps")
+    assert rankings is None
+    assert len(calls) == analysis_manager.MAX_RETRIES + 1
+
+def test_fetch_many_maps_responses_to_encounters():
+    async def fake_fetch(client, token, encounter_id, difficulty, metric):
+        return {"encounter": encounter_id} if encounter_id != 2 else None
+
+    with patch('src.manager.analysis_manager.get_dps_rankings_async', new=AsyncMock(side_effect=fake_fetch)) as mock_fetch:
+        results = asyncio.run(fetch_many("mock_token", [1, 2, 3, 1]))
+
+    assert results == {1: {"encounter": 1}, 2: None, 3: {"encounter": 3}}
+    assert mock_fetch.await_count == 3
+
+def test_fetch_many_uses_http2_client():
+    created = []
+
+    class RecordingClient(httpx.AsyncClient):
+        def __init__(self, **kwargs):
+            created.append(kwargs)
+            super().__init__(**kwargs)
+
+    with patch('src.manager.analysis_manager.httpx.AsyncClient', RecordingClient), \
+         patch('src.manager.analysis_manager.get_dps_rankings_async', new=AsyncMock(return_value=None)):
+        asyncio.run(fetch_many("mock_token", [1, 2]))
+
+    assert len(created) == 1
+    assert created[0]["http2"] is True
+
+# --- Tests for get_many_dps_rankings ---
+
+def test_get_many_dps_rankings_maps_responses_to_encounters():
+    def fake_fetch(token, encounter_id, difficulty, metric):
+        return {"encounter": encounter_id} if encounter_id != 2 else None
+
+    with patch('src.manager.analysis_manager.get_dps_rankings', side_effect=fake_fetch) as mock_fetch:
+        results = get_many_dps_rankings("mock_token", [1, 2, 3, 1], max_workers=2)
+
+    assert results == {1: {"encounter": 1}, 2: None, 3: {"encounter": 3}}
+    assert list(results) == [1, 2, 3]
+    assert mock_fetch.call_count == 3
+
+def test_get_many_dps_rankings_caps_workers_at_pool_size():
+    with patch('src.manager.analysis_manager.ThreadPoolExecutor', wraps=analysis_manager.ThreadPoolExecutor) as mock_executor, \
+         patch('src.manager.analysis_manager.get_dps_rankings', return_value=None):
+        get_many_dps_rankings("mock_token", [1, 2], max_workers=100)
+
+    mock_executor.assert_called_once_with(max_workers=analysis_manager.HTTP_POOL_MAXSIZE)
+    assert analysis_manager._SESSION.get_adapter(analysis_manager.API_URL)._pool_maxsize == analysis_manager.HTTP_POOL_MAXSIZE
 
-def test_get_dps_rankings_http_error():
-    mock_response = MagicMock()
-    mock_response.status_code = 500
-    mock_response.raise_for_status.side_effect = requests.exceptions.HTTPError("500 Server Error")
+def test_get_many_dps_rankings_empty():
+    assert get_many_dps_rankings("mock_token", []) == {}
 
-    with patch('requests.post', return_value=mock_response):
-        rankings = get_dps_rankings("mock_token", 123, 5, "dps")
-        assert rankings is None
+# --- Tests for the retry policy ---
 
-def test_get_dps_rankings_json_decode_error():
-    mock_response = MagicMock()
-    mock_response.status_code = 200
-    mock_response.json.side_effect = json.JSONDecodeError("Invalid JSON", "", 0)
-    mock_response.raise_for_status.return_value = None
+def test_retry_delay_honors_numeric_retry_after():
+    assert analysis_manager._retry_delay(0, "7") == 7.0
 
-    with patch('requests.post', return_value=mock_response):
-        rankings = get_dps_rankings("mock_token", 123, 5, "dps")
-        assert rankings is None
+def test_retry_delay_caps_long_retry_after():
+    assert analysis_manager._retry_delay(0, "3600") == analysis_manager.RETRY_BACKOFF_CAP
+
+def test_session_caps_long_retry_after():
+    retry = analysis_manager._SESSION.get_adapter(analysis_manager.API_URL).max_retries
+    assert retry.parse_retry_after("3600") == analysis_manager.RETRY_BACKOFF_CAP
+    assert retry.new(total=1).parse_retry_after("3600") == analysis_manager.RETRY_BACKOFF_CAP
+
+def test_retry_delay_uses_capped_backoff_with_jitter():
+    assert 0.25 <= analysis_manager._retry_delay(0, None) <= 0.75
+    assert 0.25 <= analysis_manager._retry_delay(0, "Wed, 21 Oct 2015 07:28:00 GMT") <= 0.75
+    assert analysis_manager._retry_delay(20, None) <= analysis_manager.RETRY_BACKOFF_CAP * 1.5
+
+def test_session_retries_rate_limited_posts():
+    retry = analysis_manager._SESSION.get_adapter(analysis_manager.API_URL).max_retries
+    assert 429 in retry.status_forcelist
+    assert retry.is_retry("POST", 429)
+    assert retry.respect_retry_after_header
 
 # --- Tests for parse_rankings_response ---
 
@@ -128,11 +443,32 @@ def test_parse_rankings_response_success():
     assert len(parsed_data["rankings"]) == 1
     assert parsed_data["rankings"][0]["name"] == "Player1"
 
+def test_parse_rankings_response_keeps_top_entries_only():
+    rankings = [{"name": f"Player{i}", "amount": i + 0.5} for i in range(25)]
+    api_response = {
+        "data": {
+            "worldData": {
+                "encounter": {
+                    "name": "Test Boss",
+                    "characterRankings": json.dumps({"page": 1, "rankings": rankings})
+                }
+            }
+        }
+    }
+    parsed_data = parse_rankings_response(api_response)
+    assert parsed_data["rankings"] == rankings[:10]
+    assert isinstance(parsed_data["rankings"][0]["amount"], float)
+
 def test_parse_rankings_response_missing_encounter_data():
     api_response = {"data": {"worldData": {}}}
     parsed_data = parse_rankings_response(api_response)
     assert parsed_data is None
 
+def test_parse_rankings_response_null_data():
+    api_response = {"data": None, "errors": [{"message": "Boom"}]}
+    parsed_data = parse_rankings_response(api_response)
+    assert parsed_data is None
+
 def test_parse_rankings_response_missing_character_rankings():
     api_response = {"data": {"worldData": {"encounter": {"name": "Test Boss"}}}}
     parsed_data = parse_rankings_response(api_response)
@@ -166,6 +502,11 @@ def test_format_rankings_as_markdown_success():
     assert "1 | PlayerA | 12345.67 | Warrior | Fury | GuildA | ServerA | abc1" in markdown
     assert "2 | PlayerB | 9876.54 | Mage | Fire | GuildB | ServerB | def2" in markdown
 
+def test_format_rankings_as_markdown_missing_fields():
+    rankings_data = [{"name": "PlayerC", "amount": 100, "guild": None}]
+    markdown = format_rankings_as_markdown("Test Encounter", rankings_data)
+    assert markdown.endswith("1 | PlayerC | 100.00 | N/A | N/A | N/A | N/A | N/A")
+
 def test_format_rankings_as_markdown_empty_rankings():
     markdown = format_rankings_as_markdown("Test Encounter", [])
     assert markdown == "No rankings to display.\n"
@@ -178,17 +519,29 @@ def test_save_markdown_output_success(tmp_path):
     save_markdown_output(test_content, str(test_filename))
     assert test_filename.read_text(encoding="utf-8") == test_content
 
-def test_save_markdown_output_io_error():
+def test_save_markdown_output_streams_lines(tmp_path):
+    rankings_data = [{"rank": 1, "name": "PlayerA", "amount": 1.0}]
+    test_filename = tmp_path / "test_rankings.md"
+    save_markdown_output(iter_rankings_markdown("Test Encounter", rankings_data), str(test_filename))
+    expected = format_rankings_as_markdown("Test Encounter", rankings_data) + "\n"
+    assert test_filename.read_text(encoding="utf-8") == expected
+
+def test_save_markdown_output_streams_empty_rankings(tmp_path):
+    test_filename = tmp_path / "test_rankings.md"
+    save_markdown_output(iter_rankings_markdown("Test Encounter", []), str(test_filename))
+    assert test_filename.read_text(encoding="utf-8") == format_rankings_as_markdown("Test Encounter", [])
+
+def test_save_markdown_output_io_error(caplog):
     with patch('builtins.open', side_effect=IOError("Permission denied")):
-        # We expect a print statement for the error, so capture stdout
-        with patch('builtins.print') as mock_print:
-            save_markdown_output("some content", "/nonexistent/path/file.md")
-            mock_print.assert_called_with("Error saving markdown output to file: Permission denied")
+        save_markdown_output("some content", "/nonexistent/path/file.md")
+    assert caplog.record_tuples == [
+        ("src.manager.analysis_manager", logging.ERROR, "Error saving markdown output to file: Permission denied")
+    ]
 
 # --- Tests for main function ---
 
 @patch('src.manager.analysis_manager.save_markdown_output')
-@patch('src.manager.analysis_manager.format_rankings_as_markdown')
+@patch('src.manager.analysis_manager.iter_rankings_markdown')
 @patch('src.manager.analysis_manager.parse_rankings_response')
 @patch('src.manager.analysis_manager.get_dps_rankings')
 @patch('src.manager.analysis_manager.get_access_token')
@@ -198,21 +551,21 @@ def test_main_success(
     mock_get_access_token,
     mock_get_dps_rankings,
     mock_parse_rankings_response,
-    mock_format_rankings_as_markdown,
+    mock_iter_rankings_markdown,
     mock_save_markdown_output
 ):
     mock_get_access_token.return_value = "mock_token"
     mock_get_dps_rankings.return_value = {"data": {"worldData": {"encounter": {"name": "Test Boss", "characterRankings": '{"rankings": []}'}}}} # Simplified response
     mock_parse_rankings_response.return_value = {"encounter_name": "Test Boss", "rankings": []}
-    mock_format_rankings_as_markdown.return_value = "# Mock Markdown"
+    mock_iter_rankings_markdown.return_value = iter(["# Mock Markdown"])
 
     main()
 
     mock_get_access_token.assert_called_once_with("mock_client_id", "mock_client_secret")
     mock_get_dps_rankings.assert_called_once_with("mock_token", 3016, 5, "dps")
     mock_parse_rankings_response.assert_called_once()
-    mock_format_rankings_as_markdown.assert_called_once_with("Test Boss", [])
-    mock_save_markdown_output.assert_called_once_with("# Mock Markdown")
+    mock_iter_rankings_markdown.assert_called_once_with("Test Boss", [])
+    mock_save_markdown_output.assert_called_once_with(mock_iter_rankings_markdown.return_value)
 
 @patch('builtins.print')
 @patch('src.manager.analysis_manager.get_access_token', return_value=None)